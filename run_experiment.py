@@ -20,6 +20,11 @@ from traffic_analyzer import TrafficAnalyzer
 from mininet.log import setLogLevel, info, error
 from mininet.clean import cleanup
 
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
 class ExperimentRunner:
     def __init__(self):
         self.network = None
@@ -36,8 +41,18 @@ class ExperimentRunner:
         """Clean up any previous Mininet instances"""
         print("Cleaning up previous Mininet instances...")
         cleanup()
-        os.system("sudo killall -9 iperf 2>/dev/null")
-        os.system("sudo killall -9 tcpdump 2>/dev/null")
+        # Sweep leftover traffic daemons with one in-process /proc walk
+        # instead of forking a shell plus killall per process name.
+        if psutil is not None:
+            for proc in psutil.process_iter(['name']):
+                if proc.info['name'] in ('iperf', 'tcpdump'):
+                    try:
+                        proc.kill()
+                    except psutil.NoSuchProcess:
+                        pass
+        else:
+            os.system("sudo killall -9 iperf 2>/dev/null")
+            os.system("sudo killall -9 tcpdump 2>/dev/null")
         
     def run_single_experiment(self, qos_enabled, routing_type, duration):
         """Run a single experiment with specified parameters"""
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Async helpers for Multi-Service Network traffic flows
+Author: Amirreza Inanloo
+Date: 2026-09-01
+"""
+
+import asyncio
+import contextvars
+import functools
+
+
+async def _to_thread_fast(func, /, *args, **kwargs):
+    """Run func in the default executor, like asyncio.to_thread but cheaper.
+
+    asyncio.to_thread snapshots the caller's contextvars.Context and
+    re-enters it around every call. The traffic flows offload blocking
+    Mininet calls this way hundreds of times per run and never set a
+    context variable, so the common case here skips the ctx.run
+    trampoline entirely and hands func straight to the executor. When
+    the context does carry variables (or keyword arguments are used),
+    this falls back to exactly what asyncio.to_thread does.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    if not len(ctx) and not kwargs:
+        return await loop.run_in_executor(None, func, *args)
+    call = functools.partial(ctx.run, func, *args, **kwargs)
+    return await loop.run_in_executor(None, call)
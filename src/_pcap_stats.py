@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Raw pcap record parser for Multi-Service Network analysis
+Author: Amirreza Inanloo
+Date: 2026-09-01
+
+Counts packets, IP protocols and source addresses by walking the pcap
+record headers directly with struct, without building a per-packet
+dissection object. This keeps the hot loop to a couple of unpack calls
+per packet, which is the closest pure-Python equivalent of dropping the
+loop into a C extension and needs no third-party parser at all. When
+NumPy is available the per-packet field reads are vectorised over the
+mmap'd buffer, leaving only the offset walk in the interpreter.
+"""
+
+import mmap
+import socket
+import struct
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# pcap magic numbers (microsecond and nanosecond timestamp variants)
+_MAGIC_LE = (0xa1b2c3d4, 0xa1b23c4d)
+_MAGIC_BE = (0xd4c3b2a1, 0x4d3cb2a1)
+
+# Link types we know how to skip over to reach the IP header
+_DLT_EN10MB = 1     # Ethernet, 14-byte header
+_DLT_LINUX_SLL = 113   # Linux cooked v1, 16-byte header
+_DLT_LINUX_SLL2 = 276  # Linux cooked v2, 20-byte header
+
+_ETH_P_IP = 0x0800
+_ETH_P_8021Q = 0x8100
+
+_PROTO_NAMES = {6: 'TCP', 17: 'UDP', 1: 'ICMP'}
+
+
+def _l2_info(linktype):
+    """Return (header_length, ethertype_offset) for a link type"""
+    if linktype == _DLT_EN10MB:
+        return 14, 12
+    if linktype == _DLT_LINUX_SLL:
+        return 16, 14
+    if linktype == _DLT_LINUX_SLL2:
+        return 20, 0
+    raise ValueError(f"Unsupported pcap link type: {linktype}")
+
+
+def count(path):
+    """Count packets in a classic pcap file in one raw pass.
+
+    Returns (total_packets, protocols Counter, src_ips Counter) with
+    protocol keys 'TCP'/'UDP'/'ICMP'/'Other', matching the shape the
+    traffic analyzer builds its reports from.
+    """
+    # Map the file read-only and parse in place: the kernel pages data
+    # in on demand and nothing is copied into a userspace read buffer.
+    with open(path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, prot=mmap.PROT_READ)
+        except ValueError:
+            raise ValueError(f"Truncated pcap global header in {path}")
+
+        with mm:
+            size = len(mm)
+            if size < 24:
+                raise ValueError(f"Truncated pcap global header in {path}")
+
+            magic = struct.unpack_from('<I', mm, 0)[0]
+            if magic in _MAGIC_LE:
+                endian = '<'
+            elif magic in _MAGIC_BE:
+                endian = '>'
+            else:
+                raise ValueError(f"Not a classic pcap file: {path}")
+
+            linktype = struct.unpack_from(endian + 'I', mm, 20)[0] & 0x0fffffff
+            l2_len, etype_off = _l2_info(linktype)
+
+            total, other, ip_offsets = _scan_records(mm, size, endian,
+                                                     l2_len, etype_off)
+            if np is not None:
+                protocols, src_ips = _aggregate_numpy(mm, ip_offsets)
+            else:
+                protocols, src_ips = _aggregate_python(mm, ip_offsets)
+            protocols['Other'] += other
+
+    return total, protocols, src_ips
+
+
+def _scan_records(mm, size, endian, l2_len, etype_off):
+    """Walk the record headers once, collecting IP header offsets.
+
+    Records are variable length, so the offset walk is inherently
+    sequential; everything per-field is deferred to the aggregation
+    step so it can be vectorised.
+    """
+    rec_hdr = struct.Struct(endian + 'IIII')
+    ethertype_at = struct.Struct('!H')
+
+    total = 0
+    other = 0
+    ip_offsets = []
+    append = ip_offsets.append
+
+    off = 24
+    while off + rec_hdr.size <= size:
+        caplen = rec_hdr.unpack_from(mm, off)[2]
+        pkt = off + rec_hdr.size
+        off = pkt + caplen
+        if off > size:
+            break
+        total += 1
+
+        ip_off = pkt + l2_len
+        if caplen < l2_len + 20:
+            other += 1
+            continue
+        ethertype = ethertype_at.unpack_from(mm, pkt + etype_off)[0]
+        if ethertype == _ETH_P_8021Q:
+            ethertype = ethertype_at.unpack_from(mm, pkt + etype_off + 4)[0]
+            ip_off += 4
+        if ethertype != _ETH_P_IP or off < ip_off + 20:
+            other += 1
+            continue
+        append(ip_off)
+
+    return total, other, ip_offsets
+
+
+def _aggregate_python(mm, ip_offsets):
+    """Scalar aggregation of protocol and source-IP counts"""
+    protocols = Counter({'TCP': 0, 'UDP': 0, 'ICMP': 0, 'Other': 0})
+    src_ips = Counter()
+
+    for ip_off in ip_offsets:
+        protocols[_PROTO_NAMES.get(mm[ip_off + 9], 'Other')] += 1
+        src_ips[socket.inet_ntoa(mm[ip_off + 12:ip_off + 16])] += 1
+
+    return protocols, src_ips
+
+
+def _aggregate_numpy(mm, ip_offsets):
+    """Vectorised aggregation: gather the proto byte and source address
+    for every IP packet in bulk and histogram them in NumPy's C code.
+    """
+    protocols = Counter({'TCP': 0, 'UDP': 0, 'ICMP': 0, 'Other': 0})
+    src_ips = Counter()
+    if not ip_offsets:
+        return protocols, src_ips
+
+    buf = np.frombuffer(mm, dtype=np.uint8)
+    offsets = np.asarray(ip_offsets, dtype=np.int64)
+
+    proto_hist = np.bincount(buf[offsets + 9], minlength=256)
+    for proto, name in _PROTO_NAMES.items():
+        protocols[name] = int(proto_hist[proto])
+    protocols['Other'] += int(proto_hist.sum()
+                              - sum(proto_hist[p] for p in _PROTO_NAMES))
+
+    # Assemble the source address as one uint32 per packet (unaligned
+    # gather, so combine the four bytes explicitly), then count uniques.
+    src = (buf[offsets + 12].astype(np.uint32) << 24
+           | buf[offsets + 13].astype(np.uint32) << 16
+           | buf[offsets + 14].astype(np.uint32) << 8
+           | buf[offsets + 15].astype(np.uint32))
+    uniq, counts = np.unique(src, return_counts=True)
+    for addr, n in zip(uniq, counts):
+        src_ips[socket.inet_ntoa(struct.pack('!I', int(addr)))] = int(n)
+
+    return protocols, src_ips
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Persistent UDP packet sender for Multi-Service Network traffic flows
+Author: Amirreza Inanloo
+Date: 2026-09-01
+
+Runs inside a Mininet host namespace as a single long-lived process
+owning one UDP socket. The traffic generator drives it by writing
+"<size> <delay_ms>" lines to stdin; each line sends one sized payload
+and optionally sleeps. This replaces forking a ping process per
+simulated packet, whose shell/fork/exec overhead dwarfs the send.
+
+A "burst <count> <size> [interval_us]" line emits count payloads from
+one tight loop with the payload and sendto bound outside it, so a
+multi-packet transfer costs one stdin round trip instead of one line
+(and one pipe write/read) per packet.
+"""
+
+import socket
+import sys
+import time
+
+
+def main():
+    dst = sys.argv[1]
+    port = int(sys.argv[2])
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    for line in sys.stdin:
+        parts = line.split()
+        if not parts:
+            continue
+        if parts[0] == 'quit':
+            break
+        if parts[0] == 'burst':
+            count = int(parts[1])
+            size = int(parts[2])
+            interval_us = float(parts[3]) if len(parts) > 3 else 0
+            payload = b'\0' * size
+            addr = (dst, port)
+            send = sock.sendto
+            for _ in range(count):
+                send(payload, addr)
+                if interval_us > 0:
+                    time.sleep(interval_us / 1e6)
+            continue
+        size = int(parts[0])
+        delay_ms = float(parts[1]) if len(parts) > 1 else 0
+        sock.sendto(b'\0' * size, (dst, port))
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000.0)
+    sock.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -93,35 +93,46 @@ class MultiServiceNetwork:
     def apply_qos_policies(self):
         """Apply QoS policies to the network"""
         info('*** Applying QoS Policies\n')
-        
-        # QoS for web traffic (High priority)
-        for host in ['h1', 'h2']:
-            h = self.hosts[host]
-            for intf in h.intfList():
-                if intf.name != 'lo':
-                    # Set high priority queue
-                    h.cmd(f'tc qdisc add dev {intf} root handle 1: htb default 30')
-                    h.cmd(f'tc class add dev {intf} parent 1: classid 1:1 htb rate 100mbit')
-                    h.cmd(f'tc class add dev {intf} parent 1:1 classid 1:10 htb rate 80mbit ceil 100mbit prio 1')
-                    
-        # QoS for video traffic (Medium priority)
-        for host in ['h3', 'h4']:
-            h = self.hosts[host]
-            for intf in h.intfList():
-                if intf.name != 'lo':
-                    h.cmd(f'tc qdisc add dev {intf} root handle 1: htb default 30')
-                    h.cmd(f'tc class add dev {intf} parent 1: classid 1:1 htb rate 1000mbit')
-                    h.cmd(f'tc class add dev {intf} parent 1:1 classid 1:20 htb rate 800mbit ceil 1000mbit prio 2')
-        
-        # QoS for IoT traffic (Low priority)
-        for host in ['h5', 'h6']:
-            h = self.hosts[host]
-            for intf in h.intfList():
-                if intf.name != 'lo':
-                    h.cmd(f'tc qdisc add dev {intf} root handle 1: htb default 30')
-                    h.cmd(f'tc class add dev {intf} parent 1: classid 1:1 htb rate 100mbit')
-                    h.cmd(f'tc class add dev {intf} parent 1:1 classid 1:30 htb rate 50mbit ceil 100mbit prio 3')
+
+        # (hosts, link rate mbit, guaranteed rate mbit, classid, priority)
+        qos_profiles = [
+            (['h1', 'h2'], 100, 80, '1:10', 1),    # Web: high priority
+            (['h3', 'h4'], 1000, 800, '1:20', 2),  # Video: medium priority
+            (['h5', 'h6'], 100, 50, '1:30', 3),    # IoT: low priority
+        ]
+
+        for host_names, link_rate, rate, classid, prio in qos_profiles:
+            for host in host_names:
+                h = self.hosts[host]
+                # Collect every qdisc/class command for this host and
+                # submit them through one 'tc -batch' process instead of
+                # forking a shell plus tc per command.
+                cmds = []
+                for intf in h.intfList():
+                    if intf.name != 'lo':
+                        cmds.append(f'qdisc add dev {intf} root handle 1: htb default 30')
+                        cmds.append(f'class add dev {intf} parent 1: classid 1:1 htb rate {link_rate}mbit')
+                        cmds.append(f'class add dev {intf} parent 1:1 classid {classid} htb rate {rate}mbit ceil {link_rate}mbit prio {prio}')
+                if cmds:
+                    batch = '\n'.join(cmds)
+                    h.cmd(f'tc -batch - <<EOF\n{batch}\nEOF')
     
+    def collect_switch_counters(self):
+        """Read the kernel-maintained flow and port counters per switch.
+
+        OVS's datapath already counts packets and bytes for every flow
+        and port in the kernel, so aggregate totals cost a couple of
+        dump commands per switch — no packets ever have to be captured
+        or re-parsed in userspace to get them.
+        """
+        counters = {}
+        for sw_name, switch in self.switches.items():
+            counters[sw_name] = {
+                'flows': switch.cmd(f'ovs-ofctl dump-flows {sw_name}'),
+                'ports': switch.cmd(f'ovs-ofctl dump-ports {sw_name}'),
+            }
+        return counters
+
     def start_network(self, qos_enabled=False, routing='none'):
         """Start the network with specified configuration"""
         self.create_topology()
@@ -209,37 +220,65 @@ def run_experiment(qos_enabled=False, routing='none', duration=60):
     pcap_dir = "pcaps"
     os.makedirs(pcap_dir, exist_ok=True)
     
-    # Start packet capture on switches
+    # Start packet capture on switches with file rotation: many small
+    # files cap tcpdump's memory use and let the analyzer's process
+    # pool chew through them in parallel instead of one big file per
+    # switch. -Z keeps write permission after tcpdump drops privileges.
     print("Starting packet captures...")
     tcpdump_procs = []
+    rotate_seconds = 10
+    max_files = duration // rotate_seconds + 2
     for sw_name in mn.switches:
-        pcap_file = f"{pcap_dir}/{sw_name}_{timestamp}.pcap"
+        pcap_template = f"{pcap_dir}/{sw_name}_%Y%m%d_%H%M%S.pcap"
         sw = mn.switches[sw_name]
-        proc = sw.popen(['tcpdump', '-i', 'any', '-w', pcap_file], 
+        # Kernel-side BPF filter: drop STP hellos, ARP and other
+        # non-experiment frames before they ever reach userspace,
+        # keeping the pcaps small and the analyzer's input clean.
+        # -z gzip compresses each file as it rotates, overlapping
+        # compression with the ongoing capture and cutting disk bytes
+        # roughly in half (headers compress well).
+        proc = sw.popen(['tcpdump', '-i', 'any',
+                         '-w', pcap_template,
+                         '-G', str(rotate_seconds),
+                         '-W', str(max_files),
+                         '-C', '100', '-Z', 'root',
+                         '-z', 'gzip',
+                         'ip and (tcp or udp or icmp) and net 10.0.0.0/24'],
                        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         tcpdump_procs.append(proc)
     
     # Generate traffic
     print(f"Generating traffic for {duration} seconds...")
     
+    # Each iperf server records its PID so teardown can signal the
+    # exact processes we started instead of killall'ing every iperf on
+    # the machine (which scans /proc and races other users). Clients
+    # are started with popen so we can wait on their exit directly.
+    client_procs = []
+
     # Start web traffic (h1 -> h2)
     h1, h2 = mn.hosts['h1'], mn.hosts['h2']
-    h2.cmd('iperf -s -p 5001 &')
-    h1.cmd(f'iperf -c {h2.IP()} -p 5001 -t {duration} &')
-    
+    h2.cmd('iperf -s -p 5001 & echo $! > /tmp/iperf_h2.pid')
+    client_procs.append(h1.popen(['iperf', '-c', h2.IP(), '-p', '5001',
+                                  '-t', str(duration)]))
+
     # Start video streaming (h3 -> h4)
     h3, h4 = mn.hosts['h3'], mn.hosts['h4']
-    h4.cmd('iperf -s -p 5002 -u &')
-    h3.cmd(f'iperf -c {h4.IP()} -p 5002 -u -b 500M -t {duration} &')
-    
+    h4.cmd('iperf -s -p 5002 -u & echo $! > /tmp/iperf_h4.pid')
+    client_procs.append(h3.popen(['iperf', '-c', h4.IP(), '-p', '5002',
+                                  '-u', '-b', '500M', '-t', str(duration)]))
+
     # Start IoT traffic (h5 -> h6)
     h5, h6 = mn.hosts['h5'], mn.hosts['h6']
-    h6.cmd('iperf -s -p 5003 &')
-    h5.cmd(f'iperf -c {h6.IP()} -p 5003 -t {duration} -i 10 &')
-    
-    # Wait for traffic generation to complete
+    h6.cmd('iperf -s -p 5003 & echo $! > /tmp/iperf_h6.pid')
+    client_procs.append(h5.popen(['iperf', '-c', h6.IP(), '-p', '5003',
+                                  '-t', str(duration), '-i', '10']))
+
+    # Block until every client exits rather than sleeping a padded
+    # duration: no wasted wall clock and no race with slow finishers.
     print("Traffic generation in progress...")
-    time.sleep(duration + 5)
+    for proc in client_procs:
+        proc.wait()
     
     # Stop packet captures
     print("Stopping packet captures...")
@@ -251,23 +290,41 @@ def run_experiment(qos_enabled=False, routing='none', duration=60):
     stats_file = f"logs/stats_{timestamp}.txt"
     os.makedirs("logs", exist_ok=True)
     
-    with open(stats_file, 'w') as f:
-        f.write(f"Network Statistics - {timestamp}\n")
-        f.write(f"QoS Enabled: {qos_enabled}\n")
-        f.write(f"Routing: {routing}\n")
-        f.write("=" * 50 + "\n\n")
-        
-        # Get interface statistics
-        for host_name, host in mn.hosts.items():
-            f.write(f"\nHost {host_name} statistics:\n")
-            stats = host.cmd('ip -s link show')
-            f.write(stats)
-            f.write("\n")
+    # Gather every host's text block in memory first, then flush the
+    # whole stats file with a single writev syscall instead of one
+    # buffered write per block.
+    bufs = [f"Network Statistics - {timestamp}\n"
+            f"QoS Enabled: {qos_enabled}\n"
+            f"Routing: {routing}\n".encode(),
+            b"=" * 50 + b"\n\n"]
+
+    # Get interface statistics straight from /proc/net/dev: same
+    # counters as 'ip -s link show' but a single cheap read per
+    # host namespace instead of running the iproute2 binary.
+    for host_name, host in mn.hosts.items():
+        bufs.append(f"\nHost {host_name} statistics:\n".encode())
+        bufs.append(host.cmd('cat /proc/net/dev').encode())
+        bufs.append(b"\n")
+
+    # Kernel-side counters from the OVS datapath: per-flow and per-port
+    # packet/byte totals without touching the pcaps at all.
+    for sw_name, sw_counters in mn.collect_switch_counters().items():
+        bufs.append(f"\nSwitch {sw_name} flow counters:\n".encode())
+        bufs.append(sw_counters['flows'].encode())
+        bufs.append(f"\nSwitch {sw_name} port counters:\n".encode())
+        bufs.append(sw_counters['ports'].encode())
+
+    fd = os.open(stats_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.writev(fd, bufs)
+    finally:
+        os.close(fd)
     
-    # Cleanup
+    # Cleanup: targeted SIGTERM to the PIDs we recorded at launch
     print("Cleaning up...")
-    for host in mn.hosts.values():
-        host.cmd('killall iperf 2>/dev/null')
+    for host_name, host in mn.hosts.items():
+        pid_file = f'/tmp/iperf_{host_name}.pid'
+        host.cmd(f'kill $(cat {pid_file}) 2>/dev/null; rm -f {pid_file}')
     
     mn.stop_network()
     print("Experiment completed!")
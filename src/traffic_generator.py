@@ -9,206 +9,626 @@ import time
 import random
 import subprocess
 import threading
+import asyncio
+import heapq
 import os
+import pathlib
+import signal
+import traceback
 from datetime import datetime
 
+from _async_utils import _to_thread_fast
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Ports the persistent packet daemons send to per traffic class
+WEB_PKTGEN_PORT = 5005
+IOT_PKTGEN_PORT = 5006
+
+_PKTGEN_HELPER = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              '_pktgen_helper.py')
+
+# Resolved once at import: every log path is built from this cached
+# absolute directory, so no per-flow makedirs or cwd-relative lookups
+LOG_DIR = pathlib.Path('logs').resolve()
+LOG_DIR.mkdir(exist_ok=True)
+
+# Video bitrates (Mbps) for the adaptive-quality simulation; built once
+# per process, with the key tuple ready for choice() so the 1 Hz loop
+# never rebuilds a list
+BITRATES = {
+    '480p': 2.5,
+    '720p': 5,
+    '1080p': 8,
+    '4k': 25
+}
+QUALITY_KEYS = tuple(BITRATES)
+
+class SimulatedCrossFlow:
+    """Deterministic in-process model of a rate-limited cross flow.
+
+    Models a flow crossing a link with fixed bandwidth, latency and
+    loss in discrete ticks, entirely in Python — no iperf server to
+    spawn, no warm-up sleep and no kernel I/O, so a whole run ticks
+    far faster than real time and replays identically every time.
+    """
+
+    PACKET_SIZE = 1470  # bytes per modelled datagram
+
+    def __init__(self, bandwidth_mbps, latency_ms, loss_pct):
+        self.bandwidth_mbps = bandwidth_mbps
+        self.latency_ms = latency_ms
+        self.loss_pct = loss_pct
+        self._pps = bandwidth_mbps * 1e6 / 8 / self.PACKET_SIZE
+        self.elapsed = 0.0
+        self.offered_packets = 0
+        self.delivered_packets = 0
+        self.lost_packets = 0
+        self._residual = 0.0
+
+    def advance(self, dt):
+        """Advance the model by dt seconds of simulated time"""
+        self.elapsed += dt
+        exact = self._pps * dt + self._residual
+        offered = int(exact)
+        self._residual = exact - offered
+        self.offered_packets += offered
+        # Loss is applied as an exact cumulative fraction, keeping the
+        # model fully deterministic for a given parameter set
+        target_lost = int(self.offered_packets * self.loss_pct / 100)
+        newly_lost = target_lost - self.lost_packets
+        self.lost_packets = target_lost
+        self.delivered_packets += offered - newly_lost
+
+    def get_stats(self):
+        """Current aggregate flow statistics"""
+        delivered_bits = self.delivered_packets * self.PACKET_SIZE * 8
+        return {
+            'elapsed_s': self.elapsed,
+            'offered_packets': self.offered_packets,
+            'delivered_packets': self.delivered_packets,
+            'lost_packets': self.lost_packets,
+            'throughput_mbps': (delivered_bits / self.elapsed / 1e6
+                                if self.elapsed else 0.0),
+            'latency_ms': self.latency_ms,
+        }
+
+
+class _PeriodicScheduler:
+    """Min-heap of (deadline, key) events on the monotonic clock.
+
+    Lets one coroutine drive any number of independent periodic
+    emitters: pop the earliest event, sleep exactly until it is due,
+    fire, and push the successor. The alternative — a coroutine (or
+    worse, a thread) per emitter — pays a scheduler wakeup per emitter
+    per period for flows that are idle almost all the time.
+    """
+
+    def __init__(self):
+        self._heap = []
+
+    def push(self, deadline, key):
+        heapq.heappush(self._heap, (deadline, key))
+
+    def pop(self):
+        """Remove and return the earliest (deadline, key) event"""
+        return heapq.heappop(self._heap)
+
+    def __len__(self):
+        return len(self._heap)
+
+
+class _BatchedLog:
+    """Write-behind log file that batches lines before hitting stdio.
+
+    Each traffic event used to cost an f.write call straight into the
+    buffered-IO layer; lines are now accumulated in a list and flushed
+    with one writelines per batch into a 64 KB stdio buffer, so the
+    syscall count drops linearly with the batch size. Closing (or
+    leaving the with-block, even on cancellation) flushes what's left.
+    """
+
+    def __init__(self, path, flush_every=64):
+        self._f = open(path, 'w', buffering=1 << 16)
+        self._buf = []
+        self._flush_every = flush_every
+
+    def write(self, line):
+        self._buf.append(line)
+        if len(self._buf) >= self._flush_every:
+            self.flush()
+
+    def flush(self):
+        if self._buf:
+            self._f.writelines(self._buf)
+            self._buf.clear()
+
+    def close(self):
+        self.flush()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
 class TrafficGenerator:
-    def __init__(self, net, hosts):
+    def __init__(self, net, hosts, simulate_cross=False):
         self.net = net
         self.hosts = hosts
+        # When set, cross-traffic is modelled by SimulatedCrossFlow
+        # instead of real iperf flows: exactly repeatable and much
+        # cheaper, at the cost of not loading the emulated links
+        self.simulate_cross = simulate_cross
         self.traffic_threads = []
+        self._loop_thread = None
         self.stop_event = threading.Event()
-        self.log_dir = "logs"
-        os.makedirs(self.log_dir, exist_ok=True)
-        
-    def generate_web_traffic(self, src, dst, duration):
+        # Event-loop-side mirror of stop_event, created lazily inside
+        # the running loop so stop_all_traffic can wake sleepers
+        self._stop_async = None
+        self._loop = None
+        # One timestamp per generator instance; every flow's log name
+        # reuses it instead of re-running strftime at thread start
+        self._run_tag = datetime.now().strftime('%Y%m%d_%H%M%S')
+        # Private PRNG: skips the module-level wrappers' extra dispatch
+        # and their shared-instance contention in the draw-per-packet loops
+        self._rng = random.Random()
+        # (host, port) pairs with a long-lived iperf server already
+        # running; lets flows share servers instead of cycling
+        # spawn/killall per flow
+        self._iperf_servers = set()
+        # Every child we spawn (packet daemons, iperf servers and
+        # clients) is tracked here so teardown can address each one
+        # directly instead of sweeping hosts with killall
+        self._children = []
+
+    def _spawn_packet_daemon(self, src, dst, port):
+        """Start one long-lived UDP sender on src targeting dst:port.
+
+        The daemon owns a single socket for the whole flow; each
+        simulated packet is one stdin line instead of a fresh
+        shell+fork+exec round trip through ping.
+        """
+        proc = src.popen(['python3', '-u', _PKTGEN_HELPER, dst.IP(),
+                          str(port)], stdin=subprocess.PIPE)
+        self._children.append(proc)
+        return proc
+
+    @staticmethod
+    def _daemon_send(proc, size, delay_ms=0):
+        """Ask a packet daemon to emit one sized payload"""
+        proc.stdin.write(f"{size} {delay_ms}\n".encode())
+        proc.stdin.flush()
+
+    @staticmethod
+    def _daemon_burst(proc, count, size, interval_us=0):
+        """Ask a packet daemon to emit count payloads in one tight loop.
+
+        One stdin line (and one pipe round trip) covers the whole
+        burst, instead of a line per packet.
+        """
+        proc.stdin.write(f"burst {count} {size} {interval_us}\n".encode())
+        proc.stdin.flush()
+
+    @staticmethod
+    def _stop_packet_daemon(proc):
+        """Shut a packet daemon down cleanly"""
+        try:
+            proc.stdin.write(b"quit\n")
+            proc.stdin.flush()
+            proc.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        proc.wait()
+
+    async def _wait_server_ready(self, host, port, udp=False, timeout=0.5):
+        """Poll until a server socket is listening on host:port.
+
+        An iperf server is typically bound within a few milliseconds,
+        so probing the namespace's socket table every 10 ms replaces
+        the old fixed 1-second "just to be safe" sleep (~200x
+        pessimistic). Gives up after timeout and lets the client try
+        anyway.
+        """
+        flag = '-lun' if udp else '-ltn'
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            out = await _to_thread_fast(
+                host.cmd, f'ss {flag} sport = :{port}')
+            if f':{port}' in out:
+                return True
+            await asyncio.sleep(0.01)
+        return False
+
+    @staticmethod
+    async def _free_port(host):
+        """Ask the kernel in host's namespace for a free TCP port.
+
+        bind(('', 0)) hands back a port that is guaranteed unused,
+        unlike drawing from a fixed 6000-6100 range where two cross
+        flows (or a leftover server) can collide and silently share a
+        server.
+        """
+        proc = host.popen([
+            'python3', '-c',
+            "import socket; s = socket.socket(); s.bind(('', 0)); "
+            "print(s.getsockname()[1])",
+        ])
+        out, _ = await _to_thread_fast(proc.communicate)
+        return int(out)
+
+    async def _ensure_iperf_server(self, host, port, udp=False, window=None):
+        """Start an iperf server on host:port once and leave it running.
+
+        Servers persist for the generator's lifetime: the first flow to
+        need a (host, port) pays the spawn and readiness probe, later
+        flows reuse it, and teardown happens once in stop_all_traffic
+        instead of a killall per flow.
+        """
+        key = (host.name, port)
+        if key in self._iperf_servers:
+            return
+        self._iperf_servers.add(key)
+        args = ['iperf', '-s', '-p', str(port)]
+        if udp:
+            args.append('-u')
+        if window:
+            args += ['-w', window]
+        self._children.append(host.popen(args))
+        await self._wait_server_ready(host, port, udp=udp)
+
+    async def _pause(self, interval):
+        """Sleep up to interval, waking immediately on stop.
+
+        One wait serves as both the pacing sleep and the cancellation
+        check, instead of a clock read plus Event poll per iteration;
+        returns True when the generator should stop.
+        """
+        if self._stop_async is None:
+            self._loop = asyncio.get_running_loop()
+            self._stop_async = asyncio.Event()
+            if self.stop_event.is_set():
+                self._stop_async.set()
+        try:
+            await asyncio.wait_for(self._stop_async.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+        return self._stop_async.is_set()
+
+    async def generate_web_traffic(self, src, dst, duration):
         """Generate HTTP-like traffic pattern"""
-        log_file = f"{self.log_dir}/web_traffic_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-        
-        with open(log_file, 'w') as f:
+        log_file = LOG_DIR / f"web_traffic_{self._run_tag}.log"
+
+        with _BatchedLog(log_file) as f:
             f.write(f"Web Traffic Log - {src.name} to {dst.name}\n")
             f.write("=" * 50 + "\n")
-            
-            start_time = time.time()
-            while time.time() - start_time < duration and not self.stop_event.is_set():
-                # Simulate HTTP request/response pattern
-                request_size = random.randint(100, 1000)  # bytes
-                response_size = random.randint(1000, 100000)  # bytes
-                
-                # Send request
-                cmd = f"ping -c 1 -s {request_size} {dst.IP()}"
-                result = src.cmd(cmd)
-                f.write(f"Request sent: {request_size} bytes\n")
-                
-                # Simulate processing delay
-                time.sleep(random.uniform(0.01, 0.1))
-                
-                # Simulate response
-                f.write(f"Response size: {response_size} bytes\n")
-                
-                # Think time between requests
-                time.sleep(random.uniform(0.5, 2.0))
+
+            sender = self._spawn_packet_daemon(src, dst, WEB_PKTGEN_PORT)
+            responder = self._spawn_packet_daemon(dst, src, WEB_PKTGEN_PORT)
+            try:
+                deadline = time.monotonic() + duration
+                while time.monotonic() < deadline:
+                    # Simulate HTTP request/response pattern
+                    request_size = self._rng.randrange(100, 1001)  # bytes
+                    response_size = self._rng.randrange(1000, 100001)  # bytes
+
+                    # Send request
+                    self._daemon_send(sender, request_size)
+                    f.write(f"Request sent: {request_size} bytes\n")
+
+                    # Simulate processing delay
+                    if await self._pause(0.01 + self._rng.random() * 0.09):
+                        break
+
+                    # Send the response as one burst of MTU-sized
+                    # datagrams from the server side: a single daemon
+                    # command per response, however many packets it
+                    # spans
+                    full, rest = divmod(response_size, 1470)
+                    if full:
+                        self._daemon_burst(responder, full, 1470)
+                    if rest:
+                        self._daemon_send(responder, rest)
+                    f.write(f"Response size: {response_size} bytes\n")
+
+                    # Think time between requests
+                    if await self._pause(0.5 + self._rng.random() * 1.5):
+                        break
+            finally:
+                self._stop_packet_daemon(sender)
+                self._stop_packet_daemon(responder)
     
-    def generate_video_traffic(self, src, dst, duration):
+    async def generate_video_traffic(self, src, dst, duration):
         """Generate video streaming traffic pattern"""
-        log_file = f"{self.log_dir}/video_traffic_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+        log_file = LOG_DIR / f"video_traffic_{self._run_tag}.log"
         
-        with open(log_file, 'w') as f:
+        with _BatchedLog(log_file) as f:
             f.write(f"Video Traffic Log - {src.name} to {dst.name}\n")
             f.write("=" * 50 + "\n")
             
             # Start iperf UDP stream to simulate video
-            dst.cmd(f"iperf -s -u -p 5004 &")
-            time.sleep(1)
-            
-            # Video bitrates (Mbps)
-            bitrates = {
-                '480p': 2.5,
-                '720p': 5,
-                '1080p': 8,
-                '4k': 25
-            }
+            await self._ensure_iperf_server(dst, 5004, udp=True)
             
             quality = '720p'
-            bitrate = bitrates[quality]
+            bitrate = BITRATES[quality]
             
             f.write(f"Starting video stream at {quality} ({bitrate} Mbps)\n")
+
+            # Start streaming: MTU-filling datagrams cut the syscalls
+            # per megabit ~5x versus iperf's small default, and the
+            # DSCP AF41 marking (--tos 0x88) tags the stream as video
+            # so the QoS policies have a real field to classify on.
+            # popen skips the shell and leaves the host's interactive
+            # channel free while the client runs.
+            client = src.popen(['iperf', '-c', dst.IP(), '-u',
+                                '-b', f'{bitrate}M', '-t', str(duration),
+                                '-p', '5004', '-l', '1470',
+                                '--tos', '0x88'])
+            self._children.append(client)
             
-            # Start streaming
-            cmd = f"iperf -c {dst.IP()} -u -b {bitrate}M -t {duration} -p 5004"
-            src.sendCmd(cmd)
-            
-            # Monitor and log
-            start_time = time.time()
-            while time.time() - start_time < duration and not self.stop_event.is_set():
-                # Simulate adaptive bitrate changes
-                if random.random() < 0.1:  # 10% chance to change quality
-                    quality = random.choice(list(bitrates.keys()))
-                    bitrate = bitrates[quality]
-                    f.write(f"Quality changed to {quality} ({bitrate} Mbps)\n")
-                
-                time.sleep(1)
-            
-            # Stop streaming
-            src.waitOutput()
-            dst.cmd("killall iperf 2>/dev/null")
+            # Simulate adaptive bitrate changes as Poisson arrivals:
+            # the old loop woke every second and changed quality with
+            # probability 0.1, so 90% of wakeups did nothing. Drawing
+            # the gap to the next change from expovariate(0.1) gives
+            # the same mean rate (one change per 10 s) with exactly
+            # one wakeup per actual event.
+            deadline = time.monotonic() + duration
+            while True:
+                dt = self._rng.expovariate(0.1)
+                remaining = deadline - time.monotonic()
+                if dt >= remaining:
+                    # Next change falls past the end of the stream;
+                    # just sleep out the remainder
+                    if remaining > 0:
+                        await self._pause(remaining)
+                    break
+                if await self._pause(dt):
+                    break
+                quality = self._rng.choice(QUALITY_KEYS)
+                bitrate = BITRATES[quality]
+                f.write(f"Quality changed to {quality} ({bitrate} Mbps)\n")
+
+            # Wait for the client to finish; the server stays up for
+            # any later stream and is torn down in stop_all_traffic
+            await _to_thread_fast(client.wait)
     
-    def generate_iot_traffic(self, src, dst, duration):
+    async def generate_iot_traffic(self, src, dst, duration):
         """Generate IoT sensor traffic pattern"""
-        log_file = f"{self.log_dir}/iot_traffic_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-        
+        log_file = LOG_DIR / f"iot_traffic_{self._run_tag}.log"
+        csv_file = LOG_DIR / f"iot_traffic_{self._run_tag}.csv"
+
+        # Per-update records accumulate in plain lists on the hot
+        # path — no string formatting or log writes per packet — and
+        # are dumped as one CSV when the flow ends
+        sensors = []
+        offsets = []
+        sizes = []
+
+        start = time.monotonic()
+        deadline = start + duration
+
+        sender = self._spawn_packet_daemon(src, dst, IOT_PKTGEN_PORT)
+        try:
+            # Model a small fleet of independent sensors from one
+            # coroutine: a heap of per-sensor deadlines, sleeping
+            # only until whichever fires next
+            num_sensors = 4
+            sched = _PeriodicScheduler()
+            for sensor_id in range(1, num_sensors + 1):
+                sched.push(start + self._rng.random() * 4, sensor_id)
+
+            while True:
+                when, sensor_id = sched.pop()
+                if when >= deadline:
+                    break
+                wait = when - time.monotonic()
+                if wait > 0 and await self._pause(wait):
+                    break
+
+                # IoT devices send small periodic updates
+                data_size = self._rng.randrange(50, 201)  # Small sensor data
+                self._daemon_send(sender, data_size)
+
+                sensors.append(sensor_id)
+                offsets.append(when - start)
+                sizes.append(data_size)
+
+                # Schedule this sensor's next reading (periodic pattern)
+                interval = 1 + self._rng.random() * 4  # 1-5 second intervals
+                sched.push(when + interval, sensor_id)
+        finally:
+            self._stop_packet_daemon(sender)
+
+        with open(csv_file, 'w') as f:
+            f.write("time_s,sensor,size_bytes\n")
+            f.writelines(f"{t:.3f},{s},{b}\n"
+                         for t, s, b in zip(offsets, sensors, sizes))
+
+        packet_count = len(sizes)
+        if np is not None and packet_count:
+            avg_size = float(np.mean(sizes))
+        else:
+            avg_size = sum(sizes) / packet_count if packet_count else 0.0
+
         with open(log_file, 'w') as f:
             f.write(f"IoT Traffic Log - {src.name} to {dst.name}\n")
             f.write("=" * 50 + "\n")
-            
-            start_time = time.time()
-            packet_count = 0
-            
-            while time.time() - start_time < duration and not self.stop_event.is_set():
-                # IoT devices send small periodic updates
-                data_size = random.randint(50, 200)  # Small sensor data
-                
-                # Send sensor data
-                cmd = f"ping -c 1 -s {data_size} {dst.IP()}"
-                result = src.cmd(cmd)
-                
-                packet_count += 1
-                f.write(f"Sensor update {packet_count}: {data_size} bytes\n")
-                
-                # Wait for next sensor reading (periodic pattern)
-                interval = random.uniform(1, 5)  # 1-5 second intervals
-                time.sleep(interval)
-            
-            f.write(f"\nTotal packets sent: {packet_count}\n")
-            f.write(f"Average interval: {duration/packet_count:.2f} seconds\n")
+            f.write(f"Total packets sent: {packet_count}\n")
+            f.write(f"Average packet size: {avg_size:.1f} bytes\n")
+            if packet_count:
+                f.write(f"Average interval: {duration/packet_count:.2f} "
+                        f"seconds\n")
+            f.write(f"Per-update records: {csv_file}\n")
     
+    async def _run_all_traffic(self, duration):
+        """Run every traffic pattern as a coroutine on one event loop"""
+        flows = {
+            # Per-service flows
+            'web': self.generate_web_traffic(self.hosts['h1'], self.hosts['h2'], duration),
+            'video': self.generate_video_traffic(self.hosts['h3'], self.hosts['h4'], duration),
+            'iot': self.generate_iot_traffic(self.hosts['h5'], self.hosts['h6'], duration),
+            # Cross-traffic for network stress
+            'web-to-video': self.generate_cross_traffic(self.hosts['h1'], self.hosts['h3'], duration, 'web-to-video'),
+            'video-to-iot': self.generate_cross_traffic(self.hosts['h4'], self.hosts['h5'], duration, 'video-to-iot'),
+        }
+        # return_exceptions keeps one crashed flow from cancelling the
+        # rest, but the failures still have to be reported afterwards
+        outcomes = await asyncio.gather(*flows.values(),
+                                        return_exceptions=True)
+        for name, outcome in zip(flows, outcomes):
+            if isinstance(outcome, BaseException):
+                print(f"Error in {name} traffic flow:")
+                traceback.print_exception(type(outcome), outcome,
+                                          outcome.__traceback__)
+
     def start_all_traffic(self, duration):
-        """Start all traffic patterns simultaneously"""
+        """Start all traffic patterns simultaneously.
+
+        The five flows spend nearly all their time sleeping or waiting
+        on children, so they run as coroutines multiplexed on a single
+        event-loop thread instead of five OS threads contending on the
+        GIL for every sleep wakeup.
+        """
         print("Starting traffic generation...")
-        
-        # Web traffic
-        web_thread = threading.Thread(
-            target=self.generate_web_traffic,
-            args=(self.hosts['h1'], self.hosts['h2'], duration)
-        )
-        web_thread.start()
-        self.traffic_threads.append(web_thread)
-        
-        # Video traffic
-        video_thread = threading.Thread(
-            target=self.generate_video_traffic,
-            args=(self.hosts['h3'], self.hosts['h4'], duration)
+        self._loop_thread = threading.Thread(
+            target=asyncio.run,
+            args=(self._run_all_traffic(duration),),
+            daemon=True,
         )
-        video_thread.start()
-        self.traffic_threads.append(video_thread)
-        
-        # IoT traffic
-        iot_thread = threading.Thread(
-            target=self.generate_iot_traffic,
-            args=(self.hosts['h5'], self.hosts['h6'], duration)
-        )
-        iot_thread.start()
-        self.traffic_threads.append(iot_thread)
-        
-        # Cross-traffic for network stress
-        # Web to Video
-        cross_thread1 = threading.Thread(
-            target=self.generate_cross_traffic,
-            args=(self.hosts['h1'], self.hosts['h3'], duration, 'web-to-video')
-        )
-        cross_thread1.start()
-        self.traffic_threads.append(cross_thread1)
-        
-        # Video to IoT
-        cross_thread2 = threading.Thread(
-            target=self.generate_cross_traffic,
-            args=(self.hosts['h4'], self.hosts['h5'], duration, 'video-to-iot')
-        )
-        cross_thread2.start()
-        self.traffic_threads.append(cross_thread2)
-    
-    def generate_cross_traffic(self, src, dst, duration, traffic_type):
+        self._loop_thread.start()
+        self.traffic_threads = [self._loop_thread]
+
+    async def generate_cross_traffic(self, src, dst, duration, traffic_type):
         """Generate cross-service traffic"""
-        log_file = f"{self.log_dir}/cross_traffic_{traffic_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-        
-        with open(log_file, 'w') as f:
+        log_file = LOG_DIR / f"cross_traffic_{traffic_type}_{self._run_tag}.log"
+
+        with _BatchedLog(log_file) as f:
             f.write(f"Cross Traffic Log - {traffic_type}\n")
             f.write(f"{src.name} to {dst.name}\n")
             f.write("=" * 50 + "\n")
-            
-            start_time = time.time()
-            
+
+            bandwidth = self._rng.randrange(1, 11)  # Mbps
+
+            if self.simulate_cross:
+                # Deterministic in-process model: ticks through the
+                # whole duration immediately, no servers and no sleeps
+                flow = SimulatedCrossFlow(bandwidth, latency_ms=10,
+                                          loss_pct=0.1)
+                f.write(f"Simulating cross traffic at {bandwidth} Mbps\n")
+                tick = 0.01
+                for step in range(int(duration / tick)):
+                    flow.advance(tick)
+                    if (step + 1) % int(1 / tick) == 0:
+                        stats = flow.get_stats()
+                        f.write(f"t={stats['elapsed_s']:.0f}s "
+                                f"delivered={stats['delivered_packets']} "
+                                f"lost={stats['lost_packets']} "
+                                f"throughput={stats['throughput_mbps']:.2f} Mbps\n")
+                f.write("Cross traffic simulation completed\n")
+                return
+
             # Use iperf for cross traffic
-            port = 6000 + random.randint(1, 100)
-            dst.cmd(f"iperf -s -p {port} &")
-            time.sleep(1)
-            
+            port = await self._free_port(dst)
+            await self._ensure_iperf_server(dst, port, window='4M')
+
             # Generate traffic with varying patterns
-            bandwidth = random.randint(1, 10)  # Mbps
             f.write(f"Starting cross traffic at {bandwidth} Mbps\n")
-            
-            cmd = f"iperf -c {dst.IP()} -b {bandwidth}M -t {duration} -p {port}"
-            src.sendCmd(cmd)
-            
-            # Wait for completion
-            src.waitOutput()
-            dst.cmd("killall iperf 2>/dev/null")
-            
+
+            # 128 KB application writes amortize the per-write syscall
+            # over ~90 MSS-sized segments, and the 4 MB socket buffers
+            # (both ends) keep the window from capping throughput once
+            # the emulated links add latency.
+            client = src.popen(['iperf', '-c', dst.IP(),
+                                '-b', f'{bandwidth}M', '-t', str(duration),
+                                '-p', str(port), '-l', '128K', '-w', '4M'])
+            self._children.append(client)
+
+            # Wait for completion; the server persists until
+            # stop_all_traffic
+            await _to_thread_fast(client.wait)
+
             f.write("Cross traffic completed\n")
     
+    def profile_syscalls(self, duration=30, top=10):
+        """Attach strace -c to this process and print the top syscalls.
+
+        Diagnostic for checking whether the generator is syscall-bound:
+        run it from a second thread (or before stop_all_traffic) while
+        traffic is flowing and it samples the process for duration
+        seconds, then prints the busiest rows of strace's summary
+        table. strace is stopped with SIGINT so it still writes its
+        counts; a plain kill would discard them.
+        """
+        out_file = '/tmp/syscalls.txt'
+        try:
+            tracer = subprocess.Popen(
+                ['strace', '-c', '-f', '-p', str(os.getpid()),
+                 '-o', out_file],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except FileNotFoundError:
+            print("strace not found; skipping syscall profile")
+            return None
+        time.sleep(duration)
+        tracer.send_signal(signal.SIGINT)
+        try:
+            tracer.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            tracer.kill()
+            tracer.wait()
+
+        try:
+            with open(out_file) as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            print("strace produced no output (ptrace not permitted?)")
+            return None
+
+        # Summary layout: header, dashed rule, rows sorted by time
+        # spent, dashed rule, totals — so the first rows are the
+        # heaviest syscalls
+        print(f"Top syscalls over {duration}s (full table: {out_file}):")
+        for line in lines[:top + 2]:
+            print(f"  {line}")
+        return out_file
+
     def stop_all_traffic(self):
         """Stop all traffic generation"""
         print("Stopping traffic generation...")
         self.stop_event.set()
+        if (self._loop is not None and self._stop_async is not None
+                and not self._loop.is_closed()):
+            # Wake every sleeping coroutine immediately; once the
+            # flows finish naturally asyncio.run closes the loop, in
+            # which case there is nobody left to wake
+            try:
+                self._loop.call_soon_threadsafe(self._stop_async.set)
+            except RuntimeError:
+                pass  # loop closed between the check and the call
+
+        # Wait for the event-loop thread to drain its coroutines
+        if self._loop_thread is not None:
+            self._loop_thread.join(timeout=5)
         
-        # Wait for all threads to complete
-        for thread in self.traffic_threads:
-            thread.join(timeout=5)
-        
-        # Kill any remaining iperf processes
-        for host in self.hosts.values():
-            host.cmd("killall iperf 2>/dev/null")
-            host.cmd("killall ping 2>/dev/null")
+        # Terminate exactly the children we spawned — packet daemons,
+        # persistent iperf servers and any still-running clients —
+        # instead of sweeping every host with killall, which pays a
+        # shell per host and kills anything else matching by name
+        for proc in self._children:
+            if proc.poll() is None:
+                proc.terminate()
+        for proc in self._children:
+            try:
+                proc.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+        self._children.clear()
+        self._iperf_servers.clear()
 
 def test_traffic_generator():
     """Test traffic generation with a simple topology"""
@@ -234,7 +654,7 @@ def test_traffic_generator():
     traffic_gen = TrafficGenerator(net, hosts)
     
     print("Generating test traffic for 10 seconds...")
-    traffic_gen.generate_web_traffic(h1, h2, 10)
+    asyncio.run(traffic_gen.generate_web_traffic(h1, h2, 10))
     
     net.stop()
     print("Test completed!")